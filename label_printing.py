@@ -1,22 +1,91 @@
 import csv
+import hashlib
 import json
+from bisect import bisect_left, bisect_right
+from collections.abc import Callable, Container
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import cache, partial
+from operator import attrgetter, itemgetter
 from pathlib import Path
-from subprocess import run
+from subprocess import list2cmdline, run
 from tempfile import NamedTemporaryFile
-from tkinter import messagebox
 from typing import Self
 
-from natsort import natsort_keygen, natsorted
-from qrcode import make
-from qrcode.main import GenericImage
-
 
 SUMATRAPDF_EXECUTABLE = Path(r"binaries\SumatraPDF-3.5.2-64.exe").absolute()
 """Sumatra PDF executable absolute path."""
 TAG_DELIMITER = "|"
 """Delimiter character for multiple skipped/forced tags."""
+COMMAND_LINE_LENGTH = 30_000
+"""Maximum length of a print command line, kept below the 32,767 characters allowed by Windows."""
+EDGE_CASES: list[tuple["Box", "Tag"]] = []
+"""Boxes and the tags lying exactly on one of their edges, awaiting review."""
+LATEX_TEMPLATE = r"""\documentclass{{article}}
+\usepackage[export]{{adjustbox}}
+\usepackage{{float}}
+\usepackage[{geometry}]{{geometry}}
+\usepackage{{graphicx}}
+\usepackage{{pdflscape}}
+\usepackage[scaled]{{beramono}}
+\renewcommand*\familydefault{{\ttdefault}}
+\usepackage[T1]{{fontenc}}
+\begin{{document}}
+\begin{{landscape}}
+\noindent
+\begin{{minipage}}{{{qrcode_width}}}
+\includegraphics[width={qrcode_size}, height={qrcode_size}]{{{image}}}
+\end{{minipage}}
+\hspace{{-7.5mm}}
+\begin{{minipage}}{{{text_width}}}
+\begin{{adjustbox}}{{max width=\textwidth}}
+\centering
+\begin{{tabular}}{{c c}}
+\multicolumn{{2}}{{c}}{{\large\textbf{{{title}}}\par}} \\
+\multicolumn{{2}}{{c}}{{\large\textbf{{{subtitle}}}\par}} \\
+{rows}\end{{tabular}}
+\end{{adjustbox}}
+\end{{minipage}}
+\end{{landscape}}
+\end{{document}}
+"""
+"""LaTeX label document, to be formatted with a label layout and the label's contents."""
+LABEL_LAYOUTS: dict[str, dict[str, str]] = {
+	"small": {
+		"geometry": "margin=0mm, left=1mm, right=1mm, top=4mm, bottom=4mm, paperwidth=28mm, paperheight=89mm",
+		"qrcode_width": "30mm",
+		"qrcode_size": "25mm",
+		"text_width": "50mm",
+	},
+	"large": {
+		"geometry": "margin=0mm, left=4mm, right=1mm, top=1mm, bottom=1mm, paperwidth=59mm, paperheight=102mm",
+		"qrcode_width": "55mm",
+		"qrcode_size": "50mm",
+		"text_width": "45mm",
+	},
+}
+"""LaTeX layout of each supported label size."""
+LABEL_MAX_MARKERS: dict[str, int] = {"small": 10, "large": 26}
+"""Maximum number of tags listed on each supported label size."""
+
+
+@cache
+def get_natural_sort_key() -> Callable[[str], tuple]:
+	"""
+	Get the natural sort key generator for hole and box names.
+
+	`natsort` is only imported on first use, and the generator is created once.
+
+	### Returns
+	- `Callable[[str], tuple]` -- Natural sort key generator.
+	"""
+
+	from natsort import natsort_keygen
 
+	return natsort_keygen()
 
+
+@dataclass(slots=True, frozen=True)
 class Tag:
 	"""
 	Represents a single sample tag within a geological sampling context.
@@ -28,53 +97,31 @@ class Tag:
 	- name: `str` -- The name or identifier of the tag.
 	- starting_depth: `float` -- The starting depth of the sample, in meters.
 	- ending_depth: `float` -- The ending depth of the sample, in meters.
+	- index: `int` -- The position of the tag in its source file, ordering tags that share a depth.
+	- starting_depth_str: `str` -- The starting depth of the sample, formatted to two decimals.
+	- ending_depth_str: `str` -- The ending depth of the sample, formatted to two decimals.
 	"""
 
-	def __init__(self, hole: str, name: str, **kwargs: float | str) -> None:
-		"""
-		Initialize a new instance of the `Tag` class, representing a single sample tag.
-
-		### Parameters
-		- hole: `str` -- The identifier for the hole from which the sample was taken.
-		- name: `str` -- The name or identifier of the tag.
+	hole: str
+	name: str
+	starting_depth: float
+	ending_depth: float
+	index: int = 0
+	starting_depth_str: str = field(init=False, repr=False, compare=False)
+	ending_depth_str: str = field(init=False, repr=False, compare=False)
 
-		### Keyword Arguments
-		- starting_depth: `float | str` -- The starting depth of the sample, in meters.
-		- ending_depth: `float | str` -- The ending depth of the sample, in meters.
-		"""
-
-		self.__hole__ = hole
-		self.__name__ = name
-		self.__starting_depth__ = float(kwargs["starting_depth"])
-		self.__ending_depth__ = float(kwargs["ending_depth"])
+	def __post_init__(self) -> None:
+		object.__setattr__(self, "starting_depth_str", f"{self.starting_depth:0.2f}")
+		object.__setattr__(self, "ending_depth_str", f"{self.ending_depth:0.2f}")
 
 	def __repr__(self) -> str:
 		return str(self)
 
 	def __str__(self) -> str:
-		return f"{self.hole}-{self.name} ({self.starting_depth:.2f} m - {self.ending_depth:.2f} m)"
-
-	@property
-	def hole(self) -> str:
-		"""Hole to which this tag belongs to."""
-		return self.__hole__
-
-	@property
-	def name(self) -> str:
-		"""Name this tag."""
-		return self.__name__
-
-	@property
-	def starting_depth(self) -> float:
-		"""Starting depth this tag."""
-		return self.__starting_depth__
-
-	@property
-	def ending_depth(self) -> float:
-		"""Ending depth this tag."""
-		return self.__ending_depth__
+		return f"{self.hole}-{self.name} ({self.starting_depth_str} m - {self.ending_depth_str} m)"
 
 
+@dataclass(slots=True, eq=False)
 class Box:
 	"""
 	Represents a box that contains multiple `Tags`.
@@ -88,11 +135,27 @@ class Box:
 	- starting_depth: `float` -- The starting depth range for samples within this box, in meters.
 	- ending_depth: `float` -- The ending depth range for samples within this box, in meters.
 	- tags: `list[Tag]` -- A list of `Tag` instances that belong to this box.
-	- skipped_tags: `set[str]` -- A set of tag names that should not be included in the box.
-	- forced_tags: `set[str]` -- A set of tag names that must be included in the box regardless of other criteria.
+	- skipped_tags: `frozenset[str]` -- A set of tag names that should not be included in the box.
+	- forced_tags: `frozenset[str]` -- A set of tag names that must be included in the box regardless of other criteria.
 	- tag_at_sample_start: `bool` -- Indicates whether the tag is located at the sample's starting or ending depth.
+	- starting_depth_str: `str` -- The starting depth of the box, formatted to two decimals.
+	- ending_depth_str: `str` -- The ending depth of the box, formatted to two decimals.
+	- qrcode_data: `str` -- The data encoded in this box's QR code.
+	- content_hash: `str` -- A digest of the QR code data, identifying the label's content.
 	"""
 
+	hole: str
+	name: str
+	starting_depth: float
+	ending_depth: float
+	tags: list[Tag] = field(default_factory=list)
+	skipped_tags: frozenset[str] = frozenset()
+	forced_tags: frozenset[str] = frozenset()
+	tag_at_sample_start: bool = True
+	starting_depth_str: str = field(init=False, repr=False)
+	ending_depth_str: str = field(init=False, repr=False)
+	_hole_key: tuple = field(init=False, repr=False)
+
 	def add_tag(self, tag: Tag) -> None:
 		"""
 		Add a `Tag` to this `Box` if it meets certain criteria related to hole matching, skipped and forced tags, and depth ranges.
@@ -101,7 +164,7 @@ class Box:
 		- tag: `Tag` -- The `Tag` to potentially add to the Box.
 
 		### Note
-		May invoke a GUI dialog for edge cases.
+		Edge cases are not added, but deferred to `EDGE_CASES` for review.
 		"""
 
 		if (tag.hole != self.hole) or (tag.name in self.skipped_tags):
@@ -113,94 +176,52 @@ class Box:
 				return
 
 			if depth in {self.starting_depth, self.ending_depth}:
-				message = f'Include tag "{tag}" in box "{self}"?'
-				include_edge_case = messagebox.askyesno(title="Edge Case", message=message)
-				if not include_edge_case:
-					return
+				EDGE_CASES.append((self, tag))
+				return
 
 		self.tags.append(tag)
 
-	def __init__(self, hole: str, name: str, **kwargs: float | str) -> None:
+	def tag_line(self, tag: Tag) -> str:
 		"""
-		Initialize a new instance of the `Box` class, representing a container for multiple `Tags`.
+		Describe a `Tag` as it is listed in this box's QR code: its name, then its depth at this box's tag position.
 
 		### Parameters
-		- hole: `str` -- The identifier for the hole from which the samples in the box were taken.
-		- name: `str` -- The name or identifier of the box.
+		- tag: `Tag` -- The `Tag` to describe.
 
-		### Keyword Arguments
-		- starting_depth: `float | str` -- The starting depth of the box's sample range, in meters.
-		- ending_depth: `float | str` -- The ending depth of the box's sample range, in meters.
+		### Returns
+		- `str` -- The tag's QR code line.
 		"""
 
-		self.__hole__ = hole
-		self.__name__ = name
-		self.__starting_depth__ = float(kwargs["starting_depth"])
-		self.__ending_depth__ = float(kwargs["ending_depth"])
+		return f"{tag.name},{tag.starting_depth_str if self.tag_at_sample_start else tag.ending_depth_str}"
 
-		self.__tags__ = []
-		self.__skipped_tags__ = {}
-		self.__forced_tags__ = {}
-		self.__tag_at_sample_start__ = True
+	def __post_init__(self) -> None:
+		self.starting_depth_str = f"{self.starting_depth:0.2f}"
+		self.ending_depth_str = f"{self.ending_depth:0.2f}"
+		self._hole_key = get_natural_sort_key()(self.hole)
 
 	def __repr__(self) -> str:
-		return f"{self.hole}-{self.name} | {self.starting_depth:.2f} m - {self.ending_depth:.2f} m"
+		return f"{self.hole}-{self.name} | {self.starting_depth_str} m - {self.ending_depth_str} m"
 
 	def __str__(self) -> str:
 		return f"{self.hole}-{self.name}"
 
 	def __lt__(self, other: Self) -> bool:
 		"""Sorter key. Boxes are sorted by their starting depth if they are from the same hole, or by their hole name otherwise."""
-		return (self.starting_depth < other.starting_depth) if self.hole == other.hole else (self.hole == natsorted((self.hole, other.hole))[0])
+		return (self._hole_key, self.starting_depth) < (other._hole_key, other.starting_depth)
 
 	@property
-	def hole(self) -> str:
-		"""Hole to which this tag belongs to."""
-		return self.__hole__
+	def qrcode_data(self) -> str:
+		"""Data encoded in this box's QR code: the box itself, then each of its tags by depth."""
+		tags = sorted(self.tags, key=attrgetter("starting_depth" if self.tag_at_sample_start else "ending_depth", "index"))
 
-	@property
-	def name(self) -> str:
-		"""Name this box."""
-		return self.__name__
-
-	@property
-	def starting_depth(self) -> float:
-		"""Starting depth this box."""
-		return self.__starting_depth__
-
-	@property
-	def ending_depth(self) -> float:
-		"""Ending depth this box."""
-		return self.__ending_depth__
-
-	@property
-	def tags(self) -> list[Tag]:
-		"""Tags belonging to this box."""
-		return self.__tags__
-
-	@property
-	def skipped_tags(self) -> set[str]:
-		"""Tags that fit within this box that should be skipped."""
-		return self.__skipped_tags__
-	@skipped_tags.setter
-	def skipped_tags(self, value: set[str]) -> None:
-		self.__skipped_tags__ = set(value)
+		qrcode_lines = [f"{self.hole},{self.name},{self.starting_depth_str},{self.ending_depth_str},{self.tag_at_sample_start}"]
+		qrcode_lines.extend(self.tag_line(tag) for tag in tags)
+		return "\r\n".join(qrcode_lines)
 
 	@property
-	def forced_tags(self) -> set[str]:
-		"""Tags that do not fit within this box that should be forced anyway."""
-		return self.__forced_tags__
-	@forced_tags.setter
-	def forced_tags(self, value: set[str]) -> None:
-		self.__forced_tags__ = set(value)
-
-	@property
-	def tag_at_sample_start(self) -> bool:
-		"""Whether the tag placement is at the beginning or the end of its sample."""
-		return self.__tag_at_sample_start__
-	@tag_at_sample_start.setter
-	def tag_at_sample_start(self, value: bool) -> None:
-		self.__tag_at_sample_start__ = bool(value)
+	def content_hash(self) -> str:
+		"""Digest of this box's QR code data, used to tell whether its printed label is still up to date."""
+		return hashlib.blake2b(self.qrcode_data.encode(), digest_size=16).hexdigest()
 
 
 class Printer:
@@ -211,21 +232,48 @@ class Printer:
 
 	### Properties
 	- name: `str` -- The name of the printer. Currently hardcoded to 'DYMO LabelWriter 450'.
-	- command: `str` -- The command used to print to the printer. It includes parameters tailored to the label size and printer settings.
+	- command: `list[str]` -- The arguments used to print to the printer. It includes parameters tailored to the label size and printer settings.
 	"""
 
-	def print(self, filepath: Path | str) -> None:
+	def print(self, *filepaths: Path | str) -> None:
 		"""
-		Send a print command to the printer for the file located at the specified filepath.
+		Send a single print command to the printer for all the files located at the specified filepaths.
 
 		### Parameters
-		- filepath: `Path | str` -- The path to the file to be printed.
+		- filepaths: `Path | str` -- The paths to the files to be printed, in printing order.
+
+		### Raises
+		- `CalledProcessError` if the print command fails.
 		"""
 
-		if not isinstance(filepath, Path):
-			filepath = Path(filepath)
+		if not filepaths:
+			return
+
+		run([*self.command, *map(str, filepaths)], check=True)  # noqa: S603 (Trusted command)
+
+	def batches(self, filepaths: list[Path | str]) -> list[list[Path | str]]:
+		"""
+		Split files to be printed into batches whose print command stays within `COMMAND_LINE_LENGTH`.
 
-		run(f'{self.command} "{filepath}"', check=False)  # noqa: S603 (Trusted command)
+		### Parameters
+		- filepaths: `list[Path | str]` -- The paths to the files to be printed, in printing order.
+
+		### Returns
+		- `list[list[Path | str]]` -- The batches of filepaths, each to be printed with a single command, in printing order.
+		"""
+
+		command_length = len(list2cmdline(self.command))
+		batches: list[list[Path | str]] = []
+		length = COMMAND_LINE_LENGTH
+		for filepath in filepaths:
+			argument_length = len(list2cmdline([str(filepath)])) + 1
+			if length + argument_length > COMMAND_LINE_LENGTH:
+				batches.append([])
+				length = command_length
+			batches[-1].append(filepath)
+			length += argument_length
+
+		return batches
 
 	def __init__(self, name: str, label_size: str) -> None:
 		"""
@@ -253,7 +301,7 @@ class Printer:
 				raise ValueError(message)
 
 		self.__name__ = name
-		self.__command__ = f'"{executable}" -print-to "{self.name}" -print-settings "noscale,paper={paper}" -silent -exit-when-done'
+		self.__command__ = [str(executable), "-print-to", self.name, "-print-settings", f"noscale,paper={paper}", "-silent", "-exit-when-done"]
 
 	@property
 	def name(self) -> str:
@@ -261,101 +309,169 @@ class Printer:
 		return self.__name__
 
 	@property
-	def command(self) -> str:
-		"""Command used to send instructions to the printer."""
+	def command(self) -> list[str]:
+		"""Command arguments used to send instructions to the printer."""
 		return self.__command__
 
 
+def assign_tags(boxes: list[Box], tags: list[Tag]) -> None:
+	"""
+	Distribute the tags of a single hole among the boxes of that same hole.
+
+	Tags are sorted once by each depth, so the tags falling within a box's depth range are found by bisection instead of testing every tag against every box.
+	Forced tags lying outside that range are then added in their original order.
+
+	### Parameters
+	- boxes: `list[Box]` -- The boxes of a single hole.
+	- tags: `list[Tag]` -- The tags of that same hole.
+
+	### Note
+	Edge cases are deferred to `EDGE_CASES` for review.
+	"""
+
+	by_starting_depth = sorted(tags, key=attrgetter("starting_depth"))
+	by_ending_depth = sorted(tags, key=attrgetter("ending_depth"))
+	starting_depths = [t.starting_depth for t in by_starting_depth]
+	ending_depths = [t.ending_depth for t in by_ending_depth]
+
+	for box in boxes:
+		sorted_tags, depths = (by_starting_depth, starting_depths) if box.tag_at_sample_start else (by_ending_depth, ending_depths)
+		for tag in sorted_tags[bisect_left(depths, box.starting_depth):bisect_right(depths, box.ending_depth)]:
+			box.add_tag(tag)
+
+		if not box.forced_tags:
+			continue
+
+		for tag in tags:
+			if tag.name in box.forced_tags:
+				depth = tag.starting_depth if box.tag_at_sample_start else tag.ending_depth
+				if not (box.starting_depth <= depth <= box.ending_depth):
+					box.add_tag(tag)
+
+
+def review_edge_cases(edge_cases: list[tuple[Box, Tag]], included: Container[tuple[Box, Tag]] = ()) -> list[tuple[Box, Tag]]:
+	"""
+	Let the user review all edge cases at once, in a single dialog listing each tag alongside the box it borders.
+
+	Rows are toggled between included and excluded by double-clicking them or pressing space, and the review ends when the dialog is confirmed or closed.
+
+	### Parameters
+	- edge_cases: `list[tuple[Box, Tag]]` -- The boxes and the tags lying exactly on one of their edges.
+	- included: `Container[tuple[Box, Tag]]` -- The edge cases initially marked as included, such as those approved on an earlier run.
+
+	### Returns
+	- `list[tuple[Box, Tag]]` -- The edge cases whose tag should be included in its box.
+	"""
+
+	if not edge_cases:
+		return []
+
+	from tkinter import Tk, ttk
+
+	root = Tk()
+	root.title("Edge Cases")
+	root.rowconfigure(0, weight=1)
+	root.columnconfigure(0, weight=1)
+
+	tree = ttk.Treeview(root, columns=("include", "box", "tag"), show="headings", height=min(len(edge_cases), 20))
+	tree.heading("include", text="Include")
+	tree.heading("box", text="Box")
+	tree.heading("tag", text="Tag")
+	tree.column("include", width=60, anchor="center", stretch=False)
+	for i, (box, tag) in enumerate(edge_cases):
+		tree.insert("", "end", iid=str(i), values=("Yes" if (box, tag) in included else "No", repr(box), str(tag)))
+	tree.grid(row=0, column=0, sticky="nsew")
+
+	scrollbar = ttk.Scrollbar(root, orient="vertical", command=tree.yview)
+	tree.configure(yscrollcommand=scrollbar.set)
+	scrollbar.grid(row=0, column=1, sticky="ns")
+
+	def toggle(_event: object = None) -> None:
+		for iid in tree.selection():
+			tree.set(iid, "include", "No" if tree.set(iid, "include") == "Yes" else "Yes")
+
+	included: list[tuple[Box, Tag]] = []
+
+	def confirm() -> None:
+		included.extend(edge_cases[int(iid)] for iid in tree.get_children() if tree.set(iid, "include") == "Yes")
+		root.destroy()
+
+	tree.bind("<Double-1>", toggle)
+	tree.bind("<space>", toggle)
+	ttk.Button(root, text="Confirm", command=confirm).grid(row=1, column=0, columnspan=2, pady=4)
+	root.protocol("WM_DELETE_WINDOW", confirm)
+	root.mainloop()
+
+	return included
+
+
 # TODO: Better formatting when no tags
-def generate_latex(imagepath: Path | str, qrcode_data: str, *, tags_enabled: bool = False) -> Path:
+def generate_latex(imagepath: Path | str, qrcode_data: str, label_size: str, *, tags_enabled: bool = False) -> Path:
 	"""
 	Generate a LaTeX document from a given image path and QR code data, tailored to a specified label size.
 
 	### Parameters
 	- imagepath: `Path | str` -- The path to the QR code image file to be included in the LaTeX document.
 	- qrcode_data: `str` -- Data contained within the QR code.
+	- label_size: `str` -- The size of the label to be printed. Supported values are 'small' and 'large'.
 
 	### Returns
 	- `Path` -- Generated TEX filepath.
+
+	### Raises
+	- `ValueError` if an unsupported label size is specified.
 	"""
 
 	if not isinstance(imagepath, Path):
 		imagepath = Path(imagepath)
 
+	if (layout := LABEL_LAYOUTS.get(label_size)) is None:
+		message = "Unsupported label size!"
+		raise ValueError(message)
+
+	markers = qrcode_data.splitlines()
+	header = markers.pop(0).split(",")
+	header[-1] = ("Samples starts at tags" if header[-1].casefold() == "true" else "Samples ends at tags") if tags_enabled else ""
+
+	if len(markers) > (max_markers := LABEL_MAX_MARKERS[label_size]):
+		kept = max_markers // 2 - 1
+		markers = [*markers[:kept], "\\cdots", "\\cdots", *markers[-kept:]]
+
+	# Pair up markers two per row, padding an odd last row with an empty cell
+	rows = [f"{left} & {right}".rstrip() for left, right in zip(markers[::2], [*markers[1::2], ""])]
+	table = " \\\\\n".join(rows) + "\n" if rows else ""
+
+	latex = LATEX_TEMPLATE.format(**layout, image=imagepath.name, title=",".join(header[:-1]), subtitle=header[-1], rows=table)
 	with NamedTemporaryFile("wt", newline="", suffix=".tex", delete=False) as texfile:
-		texfile.write("\\documentclass{article}\n")
-		texfile.write("\\usepackage[export]{adjustbox}\n")
-		texfile.write("\\usepackage{float}\n")
+		texfile.write(latex)
 
-		match label_size:
-			case "small":
-				texfile.write("\\usepackage[margin=0mm, left=1mm, right=1mm, top=4mm, bottom=4mm, paperwidth=28mm, paperheight=89mm]{geometry}\n")
-			case "large":
-				texfile.write("\\usepackage[margin=0mm, left=4mm, right=1mm, top=1mm, bottom=1mm, paperwidth=59mm, paperheight=102mm]{geometry}\n")
-
-		texfile.write("\\usepackage{graphicx}\n")
-		texfile.write("\\usepackage{pdflscape}\n")
-		texfile.write("\\usepackage[scaled]{beramono}\n")
-		texfile.write("\\renewcommand*\\familydefault{\\ttdefault}\n")
-		texfile.write("\\usepackage[T1]{fontenc}\n")
-		texfile.write("\\begin{document}\n")
-		texfile.write("\\begin{landscape}\n")
-		texfile.write("\\noindent\n")
-
-		match label_size:
-			case "small":
-				texfile.write("\\begin{minipage}{30mm}\n")
-				texfile.write(f"\\includegraphics[width=25mm, height=25mm]{{{imagepath.name}}}\n")
-				texfile.write("\\end{minipage}\n")
-				texfile.write("\\hspace{-7.5mm}\n")
-				texfile.write("\\begin{minipage}{50mm}\n")
-			case "large":
-				texfile.write("\\begin{minipage}{55mm}\n")
-				texfile.write(f"\\includegraphics[width=50mm, height=50mm]{{{imagepath.name}}}\n")
-				texfile.write("\\end{minipage}\n")
-				texfile.write("\\hspace{-7.5mm}\n")
-				texfile.write("\\begin{minipage}{45mm}\n")
+	return Path(texfile.name)
 
-		texfile.write("\\begin{adjustbox}{max width=\\textwidth}\n")
-		texfile.write("\\centering\n")
-		texfile.write("\\begin{tabular}{c c}\n")
 
-		markers = qrcode_data.splitlines()
-		header = markers.pop(0).split(",")
-		header[-1] = ("Samples starts at tags" if header[-1].casefold() == "true" else "Samples ends at tags") if tags_enabled else ""
+def build_pdf(box: Box, label_size: str, *, tags_enabled: bool = False) -> Path:
+	"""
+	Generate the QR code and LaTeX document of a box's label, and compile it into a PDF.
 
-		texfile.write(f"\\multicolumn{{2}}{{c}}{{\\large\\textbf{{{','.join(header[:-1])}}}\\par}} \\\\\n")
-		texfile.write(f"\\multicolumn{{2}}{{c}}{{\\large\\textbf{{{header[-1]}}}\\par}} \\\\\n")
+	### Parameters
+	- box: `Box` -- The box to be labelled.
+	- label_size: `str` -- The size of the label to be printed. Supported values are 'small' and 'large'.
 
-		match label_size:
-			case "small":
-				if len(markers) > 10:
-					temp = markers[:4]
-					temp.append("\\cdots")
-					temp.append("\\cdots")
-					temp += markers[-4:]
-					markers = temp
-			case "large":
-				if len(markers) > 26:
-					temp = markers[:12]
-					temp.append("\\cdots")
-					temp.append("\\cdots")
-					temp += markers[-12:]
-					markers = temp
+	### Returns
+	- `Path` -- Compiled PDF filepath.
+	"""
+
+	from segno import make_qr
+
+	qrcode_data = box.qrcode_data
 
-		for i, sample in enumerate(markers):
-			if not i % 2:
-				texfile.write(sample if (i + 1) != len(markers) else f"{sample} &\n")
-			else:
-				texfile.write(f" & {sample} \\\\\n" if (i + 1) != len(markers) else f" & {sample}\n")
+	# segno does not flush the file it is given, so close it before it gets compiled
+	with NamedTemporaryFile("wb", suffix=".pdf", delete=False) as qrcodefile:
+		make_qr(qrcode_data, error="m").save(qrcodefile, kind="pdf", scale=10)
 
-		texfile.write("\\end{tabular}\n")
-		texfile.write("\\end{adjustbox}\n")
-		texfile.write("\\end{minipage}\n")
-		texfile.write("\\end{landscape}\n")
-		texfile.write("\\end{document}\n")
+	texpath = generate_latex(qrcodefile.name, qrcode_data, label_size, tags_enabled=tags_enabled)
+	run(["pdflatex", "--interaction=nonstopmode", texpath.name], cwd=texpath.parent, check=True)  # noqa: S603 (Trusted command)
 
-		return Path(texfile.name)
+	return texpath.with_suffix(".pdf")
 
 
 if __name__ == "__main__":
@@ -385,14 +501,18 @@ if __name__ == "__main__":
 		"tag_stop": "To",
 	}
 
-	# Read data about already printed labels
-	printed_labels: dict[str, list[str]] = {}
+	# Read data about already printed labels: their content hash and edge case decisions (None if recorded before these were kept)
+	printed_labels: dict[str, dict[str, dict | None]] = {}
 	if printed_datapath.exists() and printed_datapath.stat().st_size:
-		with printed_datapath.open("rt") as jsonfile:
-			printed_labels = json.load(jsonfile)
+		printed_labels = {
+			hole: dict.fromkeys(names) if isinstance(names, list) else names
+			for hole, names in json.loads(printed_datapath.read_bytes()).items()
+		}
+	printed_records = {(hole, name): record for hole, names in printed_labels.items() for name, record in names.items()}
 
 	# Read data about printable labels
 	boxes: list[Box] = []
+	boxes_by_hole: dict[str, list[Box]] = {}
 	with labels_datapath.open("rt") as csvfile:
 		reader = csv.DictReader(csvfile)
 		for r in reader:
@@ -406,60 +526,113 @@ if __name__ == "__main__":
 				ending_depth=float(r[label_keys["box_stop"]]),
 			)
 
-			if (box.hole in printed_labels) and (box.name in printed_labels[box.hole]):
+			# Labels printed without a content hash cannot be compared, so they are never reprinted
+			if ((box.hole, box.name) in printed_records) and (printed_records[box.hole, box.name] is None):
 				continue
 
 			if tags_enabled:
 				box.tag_at_sample_start = r[label_keys["tag_position"]] == tag_keys["tag_start"]
 
-				if ((st := label_keys["skipped_tags"]) is not None) and any(st_list := r[st].split(TAG_DELIMITER)):
-					box.skipped_tags = set(st_list)
+				if ((st := label_keys["skipped_tags"]) is not None) and (st_cell := r.get(st)):
+					box.skipped_tags = frozenset(st_cell.split(TAG_DELIMITER))
 
-				if ((ft := label_keys["forced_tags"]) is not None) and any(ft_list := r[ft].split(TAG_DELIMITER)):
-					box.forced_tags = set(ft_list)
+				if ((ft := label_keys["forced_tags"]) is not None) and (ft_cell := r.get(ft)):
+					box.forced_tags = frozenset(ft_cell.split(TAG_DELIMITER))
 
 			boxes.append(box)
+			boxes_by_hole.setdefault(box.hole, []).append(box)
 	boxes.sort()
 
 	# Read tag data
+	tags_by_hole: dict[str, list[Tag]] = {}
 	if tags_enabled:
-		labelled_holes = {b.hole for b in boxes}
 		with tags_datapath.open("rt") as csvfile:
-			reader = csv.DictReader(csvfile)
-			for r in reader:
-				if (not r[tag_keys["hole"]]) or (r[tag_keys["hole"]] not in labelled_holes):
-					continue
-
-				tag = Tag(
-					r[tag_keys["hole"]],
-					r[tag_keys["tag"]],
-					starting_depth=float(r.get(tag_keys["tag_start"], 0.0)),
-					ending_depth=float(r.get(tag_keys["tag_stop"], 0.0)),
-				)
-
-				[b.add_tag(tag) for b in boxes if b.hole == tag.hole]
-
+			reader = csv.reader(csvfile)
+			header = next(reader, [])
+
+			# An empty file has no header, and thus no tags
+			if header:
+				columns = [tag_keys[k] for k in ("hole", "tag", "tag_start", "tag_stop")]
+				if missing_columns := [c for c in columns if c not in header]:
+					message = f'Missing columns in "{tags_datapath}": {", ".join(missing_columns)}'
+					raise ValueError(message)
+
+				indices = [header.index(c) for c in columns]
+				get_fields = itemgetter(*indices)
+				row_width = max(indices) + 1
+				for index, r in enumerate(reader):
+					# Pad short rows with empty cells, as DictReader did, so that blank and ragged rows are skipped
+					if len(r) < row_width:
+						r += [""] * (row_width - len(r))
+
+					hole, name, tag_start, tag_stop = get_fields(r)
+					if (not hole) or (hole not in boxes_by_hole):
+						continue
+
+					tag = Tag(hole, name, starting_depth=float(tag_start), ending_depth=float(tag_stop), index=index)
+					tags_by_hole.setdefault(hole, []).append(tag)
+
+	for hole, tags in tags_by_hole.items():
+		assign_tags(boxes_by_hole[hole], tags)
+
+	edge_tags: dict[Box, list[Tag]] = {}
+	for box, tag in EDGE_CASES:
+		edge_tags.setdefault(box, []).append(tag)
+
+	# Skip labels whose content is unchanged once their earlier edge case decisions are applied again, without reviewing them
+	pending_boxes: list[Box] = []
+	pending_edge_cases: list[tuple[Box, Tag]] = []
+	previously_included: set[tuple[Box, Tag]] = set()
 	for box in boxes:
-		qrcode_data = f"{box.hole},{box.name},{box.starting_depth:0.2f},{box.ending_depth:0.2f},{box.tag_at_sample_start}"
-
-		box.tags.sort(key=lambda t: t.starting_depth if box.tag_at_sample_start else t.ending_depth)
-		for tag in box.tags:
-			qrcode_data += f"\r\n{tag.name},{tag.starting_depth if box.tag_at_sample_start else tag.ending_depth:0.2f}"
-		qrcode_image: GenericImage = make(qrcode_data)
-
-		with NamedTemporaryFile("wb", suffix=".png", delete=False) as pngfile:
-			qrcode_image.save(pngfile)
-			texpath = generate_latex(pngfile.name, qrcode_data, tags_enabled=tags_enabled)
-
-			command = f'lualatex --interaction=nonstopmode --enable-write18 "{texpath.stem}"'
-			run(command, cwd=texpath.parent, check=True)  # noqa: S603 (Trusted command)
-			printer.print(texpath.with_suffix(".pdf"))
-
-		if box.hole in printed_labels:
-			printed_labels[box.hole].append(box.name)
-		else:
-			printed_labels[box.hole] = [box.name]
-
-	[printed_labels[hole].sort(key=natsort_keygen(lambda name: name)) for hole in printed_labels]
-	with printed_datapath.open("wt") as jsonfile:
-		json.dump(printed_labels, jsonfile, indent="\t", sort_keys=True)
+		record = printed_records.get((box.hole, box.name))
+		decisions: dict[str, bool] = record["edge_tags"] if record else {}
+		box_edge_tags = edge_tags.get(box, [])
+
+		if record and all(box.tag_line(tag) in decisions for tag in box_edge_tags):
+			tag_count = len(box.tags)
+			box.tags.extend(tag for tag in box_edge_tags if decisions[box.tag_line(tag)])
+			if box.content_hash == record["hash"]:
+				continue
+			del box.tags[tag_count:]
+
+		pending_boxes.append(box)
+		pending_edge_cases.extend((box, tag) for tag in box_edge_tags)
+		previously_included.update((box, tag) for tag in box_edge_tags if decisions.get(box.tag_line(tag)))
+
+	included = set(review_edge_cases(pending_edge_cases, previously_included))
+
+	# Only print labels whose content changed, but remember every reviewed decision
+	printable_boxes: list[Box] = []
+	records: list[tuple[Box, dict]] = []
+	for box in pending_boxes:
+		box.tags.extend(tag for tag in edge_tags.get(box, []) if (box, tag) in included)
+		decisions = {box.tag_line(tag): (box, tag) in included for tag in edge_tags.get(box, [])}
+		records.append((box, {"hash": box.content_hash, "edge_tags": decisions}))
+
+		if (record := printed_records.get((box.hole, box.name))) is None or (record["hash"] != box.content_hash):
+			printable_boxes.append(box)
+
+	# Compile labels in parallel, then print them in order
+	with ProcessPoolExecutor() as executor:
+		pdf_paths = list(executor.map(partial(build_pdf, label_size=label_size, tags_enabled=tags_enabled), printable_boxes))
+
+	# Print in batches, recording the history even if a batch fails, but only with the labels printed so far
+	printed_count = 0
+	try:
+		for batch in printer.batches(pdf_paths):
+			printer.print(*batch)
+			printed_count += len(batch)
+	finally:
+		unprinted_boxes = set(printable_boxes[printed_count:])
+		records = [(box, record) for box, record in records if box not in unprinted_boxes]
+		for box, record in records:
+			printed_labels.setdefault(box.hole, {})[box.name] = record
+
+		# Only rewrite the printed labels history when labels were printed or reviewed
+		if records:
+			natural_sort_key = get_natural_sort_key()
+			printed_labels = {
+				hole: dict(sorted(names.items(), key=lambda item: natural_sort_key(item[0])))
+				for hole, names in sorted(printed_labels.items())
+			}
+			printed_datapath.write_text(json.dumps(printed_labels, indent="\t"))